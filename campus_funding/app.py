@@ -1,54 +1,96 @@
+from itertools import chain
+import math
+
 from flask import Flask, render_template, request, redirect, url_for, flash
+from jinja2 import FileSystemBytecodeCache
+from sortedcontainers import SortedKeyList
 
-from models import User, FundingRequest
-from structures import RequestBST, push_heap, pop_heap, make_queue, enqueue
-from storage import save_state, load_state
+from models import ROLE_STUDENT, ROLE_ADMIN, ROLE_DONOR, User, FundingRequest, parse_role
+from structures import RequestBST, urgency_key, push_heap, pop_heap, heap_top, compact_heap, make_queue, enqueue, remove_from_queue, iter_queue
+from storage import append_event, load_state, mark_dirty, next_request_id
 
 app = Flask(__name__)
 app.secret_key = "dev-mode-key"
 
+# Template caching: keep compiled templates in memory (larger LRU than the
+# Jinja default), never re-stat template files per render, and persist the
+# compiled bytecode so a restarted worker skips recompilation too.
+# `jinja_options` must be set before `app.jinja_env` is first accessed.
+app.jinja_options = {**app.jinja_options, "cache_size": 400}
+app.config.update(TEMPLATES_AUTO_RELOAD=False)
+app.jinja_env.auto_reload = False
+app.jinja_env.bytecode_cache = FileSystemBytecodeCache()
+
 # In-memory data structures used by the web UI (matching the CLI):
-# - `users_set` (Set): tracks unique user ids to prevent duplicate registrations.
-# - `users_map` (dict): maps user_id -> User for quick lookup.
+# - `users_map` (dict): maps user_id -> User for quick lookup; its keys also
+#   enforce unique user ids at registration.
+# - `users_by_role` (dict of dicts): role -> {user_id -> User}, so pages can
+#   list e.g. all students without scanning every user.
 # - `requests_map` (dict): maps request_id -> FundingRequest for direct access.
-# - `bst` (RequestBST): BST keyed by amount for sorted views.
-# - `heap` (list used with heapq helpers): priority queue ordered by urgency.
-# - `approved_q` (deque): FIFO queue of approved requests awaiting funding.
-users_set = set()
+# - `bst_shards` (dict of RequestBST): one BST per `SHARD_WIDTH`-wide amount
+#   range (bucket = amount // SHARD_WIDTH); concatenating the shards' inorder
+#   traversals in bucket order gives all requests sorted by amount.
+# - `heap` (list used with heapq helpers): priority queue ordered by urgency;
+#   decided requests are deleted lazily and compacted away by `admin_decide`.
+# - `approved_q` (deque): FIFO queue of approved request ids awaiting funding.
+# - `approved_deleted` (set): ids removed from `approved_q` but not yet compacted away.
 users_map = {}
+users_by_role = {ROLE_STUDENT: {}, ROLE_ADMIN: {}, ROLE_DONOR: {}}
 requests_map = {}
-bst = RequestBST()
+SHARD_WIDTH = 1000
+bst_shards = {}
+sorted_requests_cache = None  # concatenated shard inorders; reset by bst_insert
 heap = []
 approved_q = make_queue()
+approved_deleted = set()
 req_counter = 1
+# submitted requests kept sorted by urgency (highest first) for /admin;
+# updated on submit/decide so the page never scans or sorts requests_map
+# (same order as `heap`, see `urgency_key`)
+pending_view = SortedKeyList(key=urgency_key)
+
+
+def bst_insert(r):
+    global sorted_requests_cache
+    sorted_requests_cache = None
+    bucket = int(r.amount // SHARD_WIDTH)
+    shard = bst_shards.get(bucket)
+    if shard is None:
+        shard = bst_shards[bucket] = RequestBST()
+    shard.insert(r)
+
 
 # Try to load persisted state from disk. If present, reconstruct in-memory ADTs.
 loaded_users, loaded_requests = load_state()
 if loaded_users:
     users_map.update(loaded_users)
-    users_set.update(loaded_users.keys())
+    for u in loaded_users.values():
+        # unknown stored roles get their own (powerless) bucket
+        users_by_role.setdefault(u.role, {})[u.id] = u
 
 if loaded_requests:
     requests_map.update(loaded_requests)
-    # rebuild BST, heap, and approved queue from the loaded requests
+    # rebuild BST shards, heap, and approved queue from the loaded requests
     for r in requests_map.values():
-        bst.insert(r)
+        bst_insert(r)
         if r.status == "submitted":
             push_heap(heap, r)
+            pending_view.add(r)
         elif r.status == "approved":
             enqueue(approved_q, r)
     # set next request counter based on highest existing R<number>
-    maxn = 0
-    for rid in requests_map.keys():
-        if rid.startswith("R") and rid[1:].isdigit():
-            n = int(rid[1:])
-            if n > maxn:
-                maxn = n
-    req_counter = maxn + 1
+    req_counter = next_request_id(requests_map)
+
+
+def iter_approved():
+    return iter_queue(approved_q, approved_deleted, requests_map)
 
 
 def get_sorted_requests():
-    return bst.inorder()
+    global sorted_requests_cache
+    if sorted_requests_cache is None:
+        sorted_requests_cache = list(chain.from_iterable(bst_shards[k].inorder() for k in sorted(bst_shards)))
+    return sorted_requests_cache
 
 
 @app.route("/")
@@ -56,10 +98,10 @@ def index():
     return render_template(
         "index.html",
         users=list(users_map.values()),
-        students=[u for u in users_map.values() if u.role == "student"],
-        approved=list(approved_q),
+        students=list(users_by_role[ROLE_STUDENT].values()),
+        approved=list(iter_approved()),
         sorted_requests=get_sorted_requests(),
-        heap_top=(heap[0][2] if heap else None),
+        heap_top=heap_top(heap),
     )
 
 
@@ -67,20 +109,16 @@ def index():
 def donor_page():
     # show donors a view of students and approved requests; allow donations
     # prepare lists: students and approved requests
-    students = [u for u in users_map.values() if u.role == "student"]
+    students = list(users_by_role[ROLE_STUDENT].values())
     # provide current pending approved requests
-    return render_template("donor.html", students=students, approved=list(approved_q), requests=list(requests_map.values()))
+    return render_template("donor.html", students=students, approved=list(iter_approved()), requests=list(requests_map.values()))
 
 
 @app.route("/admin")
 def admin_page():
     # admin view: list all users and pending requests (by urgency)
     users = list(users_map.values())
-    # build a view of pending requests sorted by urgency (highest first)
-    heap_items = sorted([(-u, rid, req) for (u, rid, req) in [(item[0], item[1], item[2]) for item in heap]], reverse=True) if heap else []
-    # easier: build list of pending requests with urgency
-    pending = [r for r in requests_map.values() if r.status == "submitted"]
-    pending_sorted = sorted(pending, key=lambda x: -x.urgency)
+    pending_sorted = list(pending_view)
     return render_template("admin.html", users=users, pending=pending_sorted)
 
 
@@ -88,18 +126,21 @@ def admin_page():
 def register():
     uid = request.form.get("user_id", "").strip()
     name = request.form.get("name", "").strip()
-    role = request.form.get("role", "").strip().lower()
-    if not uid or not name or role not in ("student", "admin", "donor"):
+    role_name = request.form.get("role", "").strip().lower()
+    role = parse_role(role_name)
+    if not uid or not name or role is None:
         flash("Invalid registration data", 'error')
         return redirect(url_for("index"))
-    if uid in users_set:
+    if uid in users_map:
         flash("User already registered", 'error')
         return redirect(url_for("index"))
-    users_set.add(uid)
-    users_map[uid] = User(id=uid, name=name, role=role)
-    flash(f"Registered {role}: {name}", 'success')
+    user = User(id=uid, name=name, role=role)
+    users_map[uid] = user
+    users_by_role[role][uid] = user
+    flash(f"Registered {role_name}: {name}", 'success')
     # persist
-    save_state(users_map, requests_map)
+    append_event("user_add", user)
+    mark_dirty(users_map, requests_map)
     return redirect(url_for("index"))
 
 
@@ -107,7 +148,7 @@ def register():
 def submit():
     global req_counter
     sid = request.form.get("student_id", "").strip()
-    if sid not in users_map or users_map[sid].role != "student":
+    if sid not in users_map or users_map[sid].role != ROLE_STUDENT:
         flash("Student not found or invalid role", 'error')
         return redirect(url_for("index"))
     try:
@@ -116,22 +157,27 @@ def submit():
     except ValueError:
         flash("Invalid amount or urgency", 'error')
         return redirect(url_for("index"))
+    if not math.isfinite(amount):
+        flash("Invalid amount or urgency", 'error')
+        return redirect(url_for("index"))
     rid = f"R{req_counter}"
     req_counter += 1
     fr = FundingRequest(id=rid, student_id=sid, amount=amount, urgency=urgency)
     requests_map[rid] = fr
-    bst.insert(fr)
+    bst_insert(fr)
     push_heap(heap, fr)
+    pending_view.add(fr)
     flash(f"Submitted {rid} for {amount}", 'success')
     # persist
-    save_state(users_map, requests_map)
+    append_event("req_add", fr)
+    mark_dirty(users_map, requests_map)
     return redirect(url_for("index"))
 
 
 @app.route("/admin/review", methods=["POST"])
 def admin_review():
     admin_id = request.form.get("admin_id", "").strip()
-    if admin_id not in users_map or users_map[admin_id].role != "admin":
+    if admin_id not in users_map or users_map[admin_id].role != ROLE_ADMIN:
         flash("Admin not found or invalid role", 'error')
         return redirect(url_for("index"))
     req = pop_heap(heap)
@@ -150,6 +196,12 @@ def admin_decide():
     if not req:
         flash("Request not found", 'error')
         return redirect(url_for("index"))
+    if req.status != "submitted":
+        # e.g. a re-POST of an old review form; re-approving a funded request
+        # would re-queue an id that is still tombstoned in `approved_deleted`
+        flash(f"Request {rid} was already {req.status}", 'error')
+        return redirect(url_for("index"))
+    pending_view.discard(req)
     if decision == "approve":
         req.status = "approved"
         enqueue(approved_q, req)
@@ -157,8 +209,13 @@ def admin_decide():
     else:
         req.status = "rejected"
         flash(f"Request {rid} rejected", 'success')
+    # the request may still be in the heap if decided from the admin page;
+    # live heap entries are all in `pending_view`, so the rest are dead
+    if len(heap) > 2 * len(pending_view):
+        compact_heap(heap)
     # persist changes
-    save_state(users_map, requests_map)
+    append_event("req_update", req)
+    mark_dirty(users_map, requests_map)
     return redirect(url_for("index"))
 
 
@@ -171,7 +228,7 @@ def donate():
     except ValueError:
         flash("Invalid donation amount", 'error')
         return redirect(url_for("index"))
-    if donor not in users_map or users_map[donor].role != "donor":
+    if donor not in users_map or users_map[donor].role != ROLE_DONOR:
         flash("Donor not found or invalid role", 'error')
         return redirect(url_for("index"))
     req = requests_map.get(rid)
@@ -180,18 +237,13 @@ def donate():
         return redirect(url_for("index"))
     if amt >= req.amount:
         req.status = "funded"
-        # remove from approved_q
-        # rebuild to remove
-        from collections import deque
-
-        newq = deque([x for x in approved_q if x.id != rid])
-        approved_q.clear()
-        approved_q.extend(newq)
+        remove_from_queue(approved_q, approved_deleted, rid)
         flash(f"Request {rid} fully funded. Thank you!", 'success')
+        # persist
+        append_event("req_update", req)
+        mark_dirty(users_map, requests_map)
     else:
         flash("Donation insufficient to fully fund the request", 'error')
-    # persist
-    save_state(users_map, requests_map)
     return redirect(url_for("index"))
 
 
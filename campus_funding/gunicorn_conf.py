@@ -0,0 +1,10 @@
+"""gunicorn settings for the web UI (see `wsgi.py`).
+
+All users and requests live in the memory of a single process, so only one
+worker is started; concurrency comes from gevent greenlets inside it.
+Several workers would each hold their own diverging copy of the state.
+"""
+bind = "127.0.0.1:5000"
+worker_class = "gevent"
+workers = 1
+worker_connections = 1000
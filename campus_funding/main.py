@@ -3,18 +3,18 @@
 Run: python main.py
 
 This small CLI demonstrates the use of several ADTs:
-- Set (built-in) for unique users
-- Dicts for mappings
+- Dicts for mappings (user ids are unique dict keys)
+- Sets for tombstones of removed queue entries
 - BST for sorting by amount
 - heapq for urgency-priority
 - deque for approved queue
 """
-from collections import deque
+import math
 import sys
 
-from models import User, FundingRequest
-from structures import RequestBST, push_heap, pop_heap, make_queue, enqueue, dequeue
-from storage import save_state, load_state
+from models import ROLE_STUDENT, ROLE_ADMIN, ROLE_DONOR, User, FundingRequest, parse_role
+from structures import RequestBST, push_heap, pop_heap, make_queue, enqueue, remove_from_queue, iter_queue
+from storage import append_event, load_state, mark_dirty, next_request_id
 
 
 def input_nonempty(prompt: str) -> str:
@@ -26,27 +26,27 @@ def input_nonempty(prompt: str) -> str:
 
 def main():
     # ---- Data structures used by the CLI ----
-    # `users_set` (Set ADT): store unique user ids/emails to prevent duplicate registration.
-    # `users_map` (dict/hash map): maps user_id -> User object for O(1) lookup.
+    # `users_map` (dict/hash map): maps user_id -> User object for O(1) lookup;
+    #     its keys also prevent duplicate registration.
     # `requests_map` (dict/hash map): maps request_id -> FundingRequest for direct access.
     # `bst` (RequestBST): binary search tree keyed by `amount` to obtain requests
     #     in ascending order (used for option 5).
     # `heap` (list used with heapq via helpers): priority queue ordered by `urgency`
     #     (higher urgency reviewed first by admin via option 3).
-    # `approved_q` (deque): FIFO queue of approved requests waiting to be funded.
-    users_set = set()
+    # `approved_q` (deque): FIFO queue of approved request ids waiting to be funded.
+    # `approved_deleted` (set): ids removed from `approved_q` (tombstones).
     users_map = {}  # user_id -> User
     requests_map = {}  # request_id -> FundingRequest
 
     bst = RequestBST()
     heap = []
     approved_q = make_queue()
+    approved_deleted = set()
 
     # load persisted state (if any)
     loaded_users, loaded_requests = load_state()
     if loaded_users:
         users_map.update(loaded_users)
-        users_set.update(loaded_users.keys())
     if loaded_requests:
         requests_map.update(loaded_requests)
         for r in requests_map.values():
@@ -55,16 +55,8 @@ def main():
                 push_heap(heap, r)
             elif r.status == "approved":
                 enqueue(approved_q, r)
-    req_counter = 1
-    # set req_counter after loading
-    if requests_map:
-        maxn = 0
-        for rid in requests_map.keys():
-            if rid.startswith("R") and rid[1:].isdigit():
-                n = int(rid[1:])
-                if n > maxn:
-                    maxn = n
-        req_counter = maxn + 1
+    # next request number after the highest loaded R<number>
+    req_counter = next_request_id(requests_map)
 
     print("Mini Campus Funding Manager")
 
@@ -74,24 +66,25 @@ def main():
 
         if choice == "1":
             uid = input_nonempty("User ID (email or unique string): ")
-            if uid in users_set:
+            if uid in users_map:
                 print("User already registered.")
                 continue
             name = input_nonempty("Name: ")
-            role = input_nonempty("Role (student/admin/donor): ").lower()
-            if role not in ("student", "admin", "donor"):
+            role_name = input_nonempty("Role (student/admin/donor): ").lower()
+            role = parse_role(role_name)
+            if role is None:
                 print("Invalid role. Use student/admin/donor.")
                 continue
             user = User(id=uid, name=name, role=role)
-            users_set.add(uid)
             users_map[uid] = user
-            print(f"Registered {role}: {name} ({uid})")
+            print(f"Registered {role_name}: {name} ({uid})")
             # persist registration
-            save_state(users_map, requests_map)
+            append_event("user_add", user)
+            mark_dirty(users_map, requests_map)
 
         elif choice == "2":
             sid = input_nonempty("Student ID: ")
-            if sid not in users_map or users_map[sid].role != "student":
+            if sid not in users_map or users_map[sid].role != ROLE_STUDENT:
                 print("Student not found or not a student role.")
                 continue
             try:
@@ -99,6 +92,9 @@ def main():
             except ValueError:
                 print("Invalid amount.")
                 continue
+            if not math.isfinite(amount):
+                print("Invalid amount.")
+                continue
             try:
                 urgency = int(input_nonempty("Urgency (1-10, 10 highest): "))
             except ValueError:
@@ -111,12 +107,13 @@ def main():
             bst.insert(fr)
             push_heap(heap, fr)
             print(f"Submitted request {rid} for {amount} (urgency {urgency})")
-            save_state(users_map, requests_map)
+            append_event("req_add", fr)
+            mark_dirty(users_map, requests_map)
 
         elif choice == "3":
             # Admin reviews highest-priority request (by urgency)
             aid = input_nonempty("Admin ID: ")
-            if aid not in users_map or users_map[aid].role != "admin":
+            if aid not in users_map or users_map[aid].role != ROLE_ADMIN:
                 print("Admin not found or not an admin.")
                 continue
             req = pop_heap(heap)
@@ -133,22 +130,25 @@ def main():
                 req.status = "approved"
                 enqueue(approved_q, req)
                 print(f"Request {req.id} approved and queued for funding.")
-                save_state(users_map, requests_map)
+                append_event("req_update", req)
+                mark_dirty(users_map, requests_map)
             else:
                 req.status = "rejected"
                 print(f"Request {req.id} rejected.")
-                save_state(users_map, requests_map)
+                append_event("req_update", req)
+                mark_dirty(users_map, requests_map)
 
         elif choice == "4":
             donor = input_nonempty("Donor ID: ")
-            if donor not in users_map or users_map[donor].role != "donor":
+            if donor not in users_map or users_map[donor].role != ROLE_DONOR:
                 print("Donor not found or not a donor.")
                 continue
-            if not approved_q:
+            approved = list(iter_queue(approved_q, approved_deleted, requests_map))
+            if not approved:
                 print("No approved requests awaiting funding.")
                 continue
             print("Approved requests awaiting funding:")
-            for r in list(approved_q):
+            for r in approved:
                 print(f"- {r.id}: student={r.student_id}, amount={r.amount}")
             rid = input_nonempty("Request ID to fund: ")
             if rid not in requests_map or requests_map[rid].status != "approved":
@@ -162,10 +162,10 @@ def main():
             req = requests_map[rid]
             if amt >= req.amount:
                 req.status = "funded"
-                # remove from queue
-                approved_q = deque([x for x in approved_q if x.id != rid])
+                remove_from_queue(approved_q, approved_deleted, rid)
                 print(f"Request {rid} fully funded. Thank you, {users_map[donor].name}!")
-                save_state(users_map, requests_map)
+                append_event("req_update", req)
+                mark_dirty(users_map, requests_map)
             else:
                 print("Donation insufficient to fully fund the request. Try again with full amount.")
 
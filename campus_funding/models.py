@@ -1,27 +1,68 @@
 from dataclasses import dataclass
+from typing import Optional
+
+
+# User roles are stored as small integer codes; the names are only used at
+# the edges (form/CLI input, templates and persistence).
+ROLE_STUDENT, ROLE_ADMIN, ROLE_DONOR = range(3)
+ROLE_NAMES = ("student", "admin", "donor")
+_ROLE_MAP = {name: code for code, name in enumerate(ROLE_NAMES)}
+
+# Names of every role code in use: the valid roles, then any unknown role
+# names met in stored data (see `stored_role`).
+_role_names = list(ROLE_NAMES)
+_stored_role_map = dict(_ROLE_MAP)
+
+
+def parse_role(name: str) -> Optional[int]:
+    """Return the role code for a role name, or None if it is not a valid role."""
+    return _ROLE_MAP.get(name)
+
+
+def stored_role(name: str) -> int:
+    """Return the role code for a role name read back from storage.
+
+    An unknown name (from a hand-edited file or another version) gets a code
+    of its own that matches none of the `ROLE_*` constants, so the user can
+    do nothing, but keeps its name: it is written back unchanged and the
+    user's id stays taken.
+    """
+    code = _stored_role_map.get(name)
+    if code is None:
+        code = _stored_role_map[name] = len(_role_names)
+        _role_names.append(name)
+    return code
 
 
 # Data models used by the application.
 # These simple dataclasses are stored in dictionaries (hash maps)
-# so they remain lightweight and serializable in memory.
-@dataclass
+# so they remain lightweight and serializable in memory. `slots=True`
+# drops the per-instance `__dict__`, shrinking each record and making
+# attribute access (e.g. `amount`, `status`) cheaper.
+@dataclass(slots=True)
 class User:
     """Simple user record.
 
     Fields:
-    - id: unique identifier (used as key in a Set and user map)
+    - id: unique identifier (used as key in the user map)
     - name: human-friendly name
-    - role: one of 'student', 'admin', or 'donor'
+    - role: one of `ROLE_STUDENT`, `ROLE_ADMIN` or `ROLE_DONOR`
+      (`role_name` gives 'student', 'admin' or 'donor'), or a code from
+      `stored_role` for an unknown role name found in storage
 
-    The `id` values are kept in a Set ADT to prevent duplicate registrations
-    and are also stored in a dict mapping `id -> User` for quick lookup.
+    The `id` values are the keys of a dict mapping `id -> User`, which gives
+    quick lookup and prevents duplicate registrations.
     """
     id: str
     name: str
-    role: str
+    role: int
+
+    @property
+    def role_name(self) -> str:
+        return _role_names[self.role]
 
 
-@dataclass
+@dataclass(slots=True)
 class FundingRequest:
     """Funding request submitted by a student.
 
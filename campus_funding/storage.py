@@ -1,55 +1,345 @@
 """Simple JSON file persistence for in-memory state.
 
 This keeps the project small (no DB) but preserves users and requests
-across server restarts by writing a `data.json` file in the app folder.
+across server restarts. State lives in two files in the app folder:
+
+- `data.json`: a full snapshot of users and requests.
+- `data.log`: an append-only write-ahead log of mutations made since the
+  last snapshot, one JSON record per line.
+
+Each mutation appends a single small record to the log instead of
+rewriting the whole snapshot. `load_state` reads the snapshot and replays
+the log on top of it. Callers then `mark_dirty` the state, which hands a
+shallow copy of the maps to a background writer thread; the snapshot is
+rewritten (and the log cut back) at most once per `SAVE_DELAY` seconds off
+the request path, plus once more at interpreter exit or on SIGTERM.
+
+Under the gevent deployment (`wsgi.py`), `threading` is monkey-patched and
+the writer becomes a greenlet: its file writes and `fsync` then block the
+event loop while they run. Snapshots stay batched and rare, but they are
+not off the request path there the way they are with real threads.
+
+Encoding uses `orjson` when it is installed and falls back to the stdlib
+`json` module otherwise; both paths read and write UTF-8 bytes. Neither
+writes non-finite numbers (orjson would write them as `null`, the stdlib
+as `Infinity`/`NaN`), so the file format does not depend on which backend
+is installed. Older files written by `json.dump` may still contain
+`Infinity`/`NaN`; orjson rejects those, so reading falls back to the
+stdlib parser, and the affected amounts are cleaned up per record.
+
+A snapshot that cannot be parsed at all makes `load_state` raise instead
+of starting from an empty store, which the next snapshot would overwrite.
 """
+import atexit
 import json
+import logging
+import math
 import os
-from typing import Tuple, Dict
+import queue
+import signal
+import stat
+import threading
+import time
+from typing import Dict, Optional, Tuple
 
-from models import User, FundingRequest
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from models import User, FundingRequest, stored_role
 
 
 DATA_FILE = os.path.join(os.path.dirname(__file__), "data.json")
+LOG_FILE = os.path.join(os.path.dirname(__file__), "data.log")
 
+log = logging.getLogger(__name__)
 
-def save_state(users_map: Dict[str, User], requests_map: Dict[str, FundingRequest], path: str = DATA_FILE):
-    payload = {
-        "users": [
-            {"id": u.id, "name": u.name, "role": u.role} for u in users_map.values()
-        ],
-        "requests": [
-            {"id": r.id, "student_id": r.student_id, "amount": r.amount, "urgency": r.urgency, "status": r.status}
-            for r in requests_map.values()
-        ],
-    }
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(payload, f, indent=2)
+# Minimum delay between two snapshot writes by the writer thread;
+# mutations within the window are folded into the next write.
+SAVE_DELAY = 0.5
 
+# `_lock` serializes log appends with cutting the log, so no record can be
+# lost to a cut; `_save_lock` serializes whole snapshot writes. Appends only
+# wait for the (short) cut, never for a snapshot being written.
+_lock = threading.Lock()
+_save_lock = threading.Lock()
 
-def load_state(path: str = DATA_FILE) -> Tuple[Dict[str, User], Dict[str, FundingRequest]]:
-    users_map = {}
-    requests_map = {}
-    if not os.path.exists(path):
-        return users_map, requests_map
+# Holds at most the newest pending snapshot; `mark_dirty` replaces it.
+_writer_q = queue.Queue(maxsize=1)
+
+# Log bytes already folded into a snapshot and cut from the log file. Adding
+# the current log size gives a position that only ever grows, so a snapshot
+# can record exactly which log records it already contains.
+_log_base = 0
+
+
+def _dumps(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, allow_nan=False).encode("utf-8")
+
+
+def _loads(data: bytes):
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # legacy files may hold NaN/Infinity, which only the stdlib reads
+            pass
+    return json.loads(data)
+
+
+def _user_record(u: User) -> dict:
+    return {"id": u.id, "name": u.name, "role": u.role_name}
+
+
+def _request_record(r: FundingRequest) -> dict:
+    if not math.isfinite(r.amount):
+        raise ValueError(f"request {r.id} has non-finite amount {r.amount!r}")
+    return {"id": r.id, "student_id": r.student_id, "amount": r.amount, "urgency": r.urgency, "status": r.status}
+
+
+def _user_from_record(u: dict) -> User:
+    # an unknown role is kept, powerless, rather than defaulted (see stored_role)
+    role = stored_role(u.get("role", "student"))
+    return User(id=u["id"], name=u.get("name", ""), role=role)
+
+
+def _request_from_record(r: dict) -> FundingRequest:
     try:
-        with open(path, "r", encoding="utf-8") as f:
-            payload = json.load(f)
+        amt = float(r.get("amount", 0))
     except Exception:
-        return users_map, requests_map
+        amt = 0.0
+    if not math.isfinite(amt):
+        # e.g. "inf" stored as a string; such amounts cannot be written back
+        amt = 0.0
+    try:
+        urg = int(r.get("urgency", 1))
+    except Exception:
+        urg = 1
+    return FundingRequest(id=r["id"], student_id=r.get("student_id", ""), amount=amt, urgency=urg, status=r.get("status", "submitted"))
 
-    for u in payload.get("users", []):
-        users_map[u["id"]] = User(id=u["id"], name=u.get("name", ""), role=u.get("role", "student"))
 
-    for r in payload.get("requests", []):
+def _log_position(log_path: str) -> int:
+    try:
+        size = os.path.getsize(log_path)
+    except OSError:
+        size = 0
+    return _log_base + size
+
+
+def _cut_log(log_path: str, nbytes: int):
+    """Drop the first `nbytes` of the log, keeping any records after them."""
+    if nbytes >= _log_position(log_path) - _log_base:
+        open(log_path, "wb").close()
+        return
+    try:
+        with open(log_path, "rb") as f:
+            f.seek(nbytes)
+            tail = f.read()
+    except OSError:
+        tail = b""
+    tmp = log_path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(tail)
+    os.replace(tmp, log_path)
+
+
+def save_state(users_map: Dict[str, User], requests_map: Dict[str, FundingRequest], path: str = DATA_FILE, log_path: str = LOG_FILE, log_position: Optional[int] = None):
+    """Write a full snapshot and cut the log records it supersedes.
+
+    The snapshot is written to a temporary file in the same folder, fsynced
+    and then `os.replace`d over `path`. The rename is atomic, so a crash
+    mid-write never leaves a partial `data.json` next to an emptied log.
+
+    Records are encoded and streamed one at a time (one per line) through a
+    buffered writer instead of first building the whole payload in memory.
+
+    `log_position` is the log position the maps were copied at (see
+    `mark_dirty`); only records before it are cut, and a snapshot older than
+    the one already on disk is skipped. `None` means the maps are current
+    and the whole log is cut.
+    """
+    global _log_base
+    with _save_lock:
+        with _lock:
+            if log_position is None:
+                log_position = _log_position(log_path)
+            elif log_position < _log_base:
+                return
+        # one temp name per process, so workers sharing the folder never collide
+        tmp = f"{path}.{os.getpid()}.tmp"
         try:
-            amt = float(r.get("amount", 0))
-        except Exception:
-            amt = 0.0
+            os.unlink(tmp)  # left over from a crash; it may have another mode
+        except FileNotFoundError:
+            pass
+        # created like a plain open() would (0666 minus the umask) ...
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
         try:
-            urg = int(r.get("urgency", 1))
+            with os.fdopen(fd, "wb", buffering=64 * 1024) as f:
+                # ... but an existing snapshot keeps its own mode
+                try:
+                    os.chmod(tmp, stat.S_IMODE(os.stat(path).st_mode))
+                except FileNotFoundError:
+                    pass
+                f.write(b'{"users": [\n')
+                for i, u in enumerate(list(users_map.values())):
+                    if i:
+                        f.write(b",\n")
+                    f.write(_dumps(_user_record(u)))
+                f.write(b'\n], "requests": [\n')
+                for i, r in enumerate(list(requests_map.values())):
+                    if i:
+                        f.write(b",\n")
+                    f.write(_dumps(_request_record(r)))
+                f.write(b"\n]}\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        with _lock:
+            _cut_log(log_path, log_position - _log_base)
+            _log_base = log_position
+
+
+def append_event(kind: str, obj, path: str = LOG_FILE):
+    """Append one mutation record to the write-ahead log.
+
+    Supported kinds:
+    - "user_add": `obj` is a new `User`
+    - "req_add": `obj` is a new `FundingRequest`
+    - "req_update": `obj` is a `FundingRequest` whose status changed
+    """
+    if kind == "user_add":
+        rec = _user_record(obj)
+    elif kind == "req_add":
+        rec = _request_record(obj)
+    elif kind == "req_update":
+        rec = {"id": obj.id, "status": obj.status}
+    else:
+        raise ValueError(f"unknown event kind: {kind}")
+    rec["op"] = kind
+    with _lock:
+        with open(path, "ab") as f:
+            f.write(_dumps(rec) + b"\n")
+
+
+def mark_dirty(users_map: Dict[str, User], requests_map: Dict[str, FundingRequest], path: str = DATA_FILE, log_path: str = LOG_FILE):
+    """Queue a snapshot of the given maps for the background writer.
+
+    Call after `append_event`: the log already makes the change durable, so
+    the snapshot can be written later. The maps are copied (shallowly) so the
+    writer never iterates a dict a handler is mutating; a newer call replaces
+    a snapshot that has not been picked up yet.
+    """
+    with _lock:
+        item = (dict(users_map), dict(requests_map), path, log_path, _log_position(log_path))
+        try:
+            _writer_q.get_nowait()
+        except queue.Empty:
+            pass
+        _writer_q.put_nowait(item)
+
+
+def _writer_loop():
+    while True:
+        item = _writer_q.get()
+        try:
+            save_state(*item)
         except Exception:
-            urg = 1
-        requests_map[r["id"]] = FundingRequest(id=r["id"], student_id=r.get("student_id", ""), amount=amt, urgency=urg, status=r.get("status", "submitted"))
+            # keep the writer alive: the log still holds the changes and
+            # the next snapshot retries
+            log.exception("writing state snapshot failed")
+        time.sleep(SAVE_DELAY)
+
+
+def _flush_now():
+    """Write the pending snapshot (if any) synchronously."""
+    try:
+        item = _writer_q.get_nowait()
+    except queue.Empty:
+        return
+    save_state(*item)
+
+
+def _on_sigterm(signum, frame):
+    # turn SIGTERM into a normal exit so the atexit flush runs
+    raise SystemExit(128 + signum)
+
+
+threading.Thread(target=_writer_loop, name="storage-writer", daemon=True).start()
+atexit.register(_flush_now)
+# Only claim SIGTERM if nobody else (e.g. gunicorn) has installed a handler.
+if threading.current_thread() is threading.main_thread() and signal.getsignal(signal.SIGTERM) == signal.SIG_DFL:
+    signal.signal(signal.SIGTERM, _on_sigterm)
+
+
+def _replay_log(users_map: Dict[str, User], requests_map: Dict[str, FundingRequest], log_path: str):
+    if not os.path.exists(log_path):
+        return
+    with _lock:
+        with open(log_path, "rb") as f:
+            data = f.read()
+        end = data.rfind(b"\n") + 1
+        if end < len(data):
+            # a torn final line from a crash mid-append; cut it off so the
+            # next append starts a fresh line instead of being glued onto it
+            log.warning("dropping %d bytes of torn record from %s", len(data) - end, log_path)
+            with open(log_path, "r+b") as f:
+                f.truncate(end)
+            data = data[:end]
+    for line in data.splitlines():
+        try:
+            rec = _loads(line)
+        except ValueError:
+            # skip a damaged record rather than lose the rest of the log
+            continue
+        op = rec.get("op")
+        if op == "user_add":
+            users_map[rec["id"]] = _user_from_record(rec)
+        elif op == "req_add":
+            requests_map[rec["id"]] = _request_from_record(rec)
+        elif op == "req_update":
+            req = requests_map.get(rec["id"])
+            if req is not None:
+                req.status = rec.get("status", req.status)
+
+
+def next_request_id(requests_map: Dict[str, FundingRequest]) -> int:
+    """Return the next free request number (1 + highest existing `R<number>` id)."""
+    return 1 + max((int(rid[1:]) for rid in requests_map if rid.startswith("R") and rid[1:].isdigit()), default=0)
+
+
+def load_state(path: str = DATA_FILE, log_path: str = LOG_FILE) -> Tuple[Dict[str, User], Dict[str, FundingRequest]]:
+    """Load the snapshot and replay the log into fresh user/request maps.
+
+    Deliberately not memoized: each entry point (CLI, web app, each worker)
+    calls this exactly once per process at startup, so a cache would never
+    be hit, and handing out copies of cached objects costs more than parsing.
+
+    Raises ValueError if the snapshot exists but cannot be parsed; the file
+    is left untouched so it can be repaired or moved aside.
+    """
+    users_map = {}
+    requests_map = {}
+    payload = {}
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            data = f.read()
+        try:
+            payload = _loads(data)
+        except ValueError as e:
+            raise ValueError(f"cannot parse snapshot {path}: {e}; "
+                             "repair it or move it aside") from e
+
+    for u in payload.get("users", []):
+        users_map[u["id"]] = _user_from_record(u)
+
+    for r in payload.get("requests", []):
+        requests_map[r["id"]] = _request_from_record(r)
 
+    _replay_log(users_map, requests_map, log_path)
     return users_map, requests_map
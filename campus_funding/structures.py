@@ -5,15 +5,17 @@ for the ADTs required by the assignment:
 
 - A Binary Search Tree (BST) storing requests keyed by `amount`.
   The BST supports insert and inorder traversal to obtain requests
-  sorted by amount (ascending).
+  sorted by amount (ascending), and keeps itself balanced with
+  scapegoat-style partial rebuilds.
 
 - Heap helper functions (wrapping Python's `heapq`) to treat funding
   requests as a priority queue ordered by `urgency` (higher urgency
   = higher priority). We push a tuple with negative urgency so the
-  highest urgency becomes the smallest tuple from heapq's perspective.
+  highest urgency becomes the smallest tuple from heapq's perspective
+  (see `urgency_key`).
 
-- Queue helpers built on `collections.deque` to hold approved requests
-  waiting to be funded.
+- Queue helpers built on `collections.deque` to hold the ids of approved
+  requests waiting to be funded, with tombstones for O(1) removal.
 
 The implementations are intentionally minimal and documented so their
 roles are explicit when used from the CLI or web handlers.
@@ -21,7 +23,7 @@ roles are explicit when used from the CLI or web handlers.
 
 from collections import deque
 import heapq
-from typing import List, Optional
+from typing import Iterator, List, Optional
 
 from models import FundingRequest
 
@@ -30,13 +32,49 @@ class BSTNode:
     """Node of the BST holding a `FundingRequest`.
 
     Each node has `left` and `right` children. The BST ordering is
-    defined by the `amount` field of `FundingRequest`.
+    defined by the `amount` field of `FundingRequest`, copied onto the node
+    so comparisons need a single attribute load. `size` is the number of
+    nodes in the subtree rooted here and drives rebalancing.
     """
 
+    __slots__ = ("amount", "req", "left", "right", "size")
+
     def __init__(self, req: FundingRequest):
+        self.amount = req.amount
         self.req = req
         self.left: Optional['BSTNode'] = None
         self.right: Optional['BSTNode'] = None
+        self.size = 1
+
+
+def _size(node: Optional[BSTNode]) -> int:
+    return node.size if node is not None else 0
+
+
+def _copy_to_array(node: Optional[BSTNode]) -> List[BSTNode]:
+    """Return the nodes of a subtree in order (iterative traversal)."""
+    stack: List[BSTNode] = []
+    out: List[BSTNode] = []
+    while stack or node:
+        while node:
+            stack.append(node)
+            node = node.left
+        node = stack.pop()
+        out.append(node)
+        node = node.right
+    return out
+
+
+def _build_tree(nodes: List[BSTNode], lo: int, hi: int) -> Optional[BSTNode]:
+    """Relink `nodes[lo..hi]` into a perfectly balanced subtree (median as root)."""
+    if lo > hi:
+        return None
+    mid = (lo + hi) // 2
+    node = nodes[mid]
+    node.left = _build_tree(nodes, lo, mid - 1)
+    node.right = _build_tree(nodes, mid + 1, hi)
+    node.size = hi - lo + 1
+    return node
 
 
 class RequestBST:
@@ -47,82 +85,168 @@ class RequestBST:
     - Call `inorder()` to get a list of `FundingRequest` objects sorted by amount.
     - Duplicate amounts are placed to the right subtree to preserve insertion order
       for equal keys and keep the implementation simple.
+    - The sorted view is cached between inserts, so repeated `inorder()` calls
+      (one per page load) only copy a list instead of walking the tree.
+    - The tree rebalances itself scapegoat-style: after an insert, the highest
+      node whose larger child holds more than `ALPHA` of its subtree is
+      flattened in order and rebuilt perfectly balanced. Requests replayed in
+      sorted order therefore no longer degrade the tree into a linked list.
     """
 
+    ALPHA = 0.7
+
     def __init__(self):
         self.root: Optional[BSTNode] = None
+        self._sorted: Optional[List[FundingRequest]] = None
 
     def insert(self, req: FundingRequest):
         """Insert a request into the BST by amount.
 
-        Complexity: average O(log n), worst-case O(n) for unbalanced tree.
-        This minimal BST is chosen for clarity to demonstrate ordered traversal
-        without depending on external libraries.
+        Complexity: amortized O(log n) thanks to partial rebuilds. The descent
+        is an iterative loop and records the path so the unbalanced ancestor
+        (if any) can be found and rebuilt afterwards.
         """
-
-        def _insert(node: Optional[BSTNode], r: FundingRequest) -> BSTNode:
-            if node is None:
-                return BSTNode(r)
+        self._sorted = None
+        new = BSTNode(req)
+        if self.root is None:
+            self.root = new
+            return
+        path: List[BSTNode] = []
+        node = self.root
+        amount = req.amount
+        while True:
+            node.size += 1
+            path.append(node)
             # Keep duplicates to the right to allow equal amounts
-            if r.amount < node.req.amount:
-                node.left = _insert(node.left, r)
+            if amount < node.amount:
+                if node.left is None:
+                    node.left = new
+                    break
+                node = node.left
             else:
-                node.right = _insert(node.right, r)
-            return node
-
-        self.root = _insert(self.root, req)
+                if node.right is None:
+                    node.right = new
+                    break
+                node = node.right
+
+        for i, node in enumerate(path):
+            if max(_size(node.left), _size(node.right)) > self.ALPHA * node.size:
+                nodes = _copy_to_array(node)
+                subtree = _build_tree(nodes, 0, len(nodes) - 1)
+                if i == 0:
+                    self.root = subtree
+                elif path[i - 1].left is node:
+                    path[i - 1].left = subtree
+                else:
+                    path[i - 1].right = subtree
+                break
 
     def inorder(self) -> List[FundingRequest]:
-        """Return list of requests sorted by amount (ascending)."""
-        out: List[FundingRequest] = []
-
-        def _in(node: Optional[BSTNode]):
-            if not node:
-                return
-            _in(node.left)
-            out.append(node.req)
-            _in(node.right)
+        """Return list of requests sorted by amount (ascending).
 
-        _in(self.root)
-        return out
+        Uses an explicit stack instead of recursion. The traversal only runs
+        after an insert; otherwise a copy of the cached result is returned.
+        """
+        if self._sorted is None:
+            self._sorted = [node.req for node in _copy_to_array(self.root)]
+        return list(self._sorted)
 
 
 # Heap (priority queue) wrapper
+def urgency_key(req: FundingRequest) -> tuple:
+    """Review order: highest urgency first, ties in submission order.
+
+    Ties compare the numeric part of the `R<number>` id, so R10 comes after
+    R9 (a plain string compare would put it first); the full id breaks any
+    remaining tie. Shared by the heap and any other urgency-ordered view so
+    they always agree on which request is next.
+    """
+    rid = req.id
+    seq = int(rid[1:]) if rid[1:].isdigit() else 0
+    return (-req.urgency, seq, rid)
+
+
 def push_heap(heap: list, req: FundingRequest):
     """Push request into heap: higher urgency => higher priority.
 
-    Implementation detail: Python's `heapq` implements a min-heap. To treat
-    higher urgency as higher priority, we push a tuple `(-urgency, id, req)`.
-    The extra `id` field provides a deterministic tie-breaker for requests
-    that share the same urgency value.
+    Implementation detail: Python's `heapq` implements a min-heap, so we push
+    `(urgency_key(req), req)`; its negated urgency puts the highest urgency
+    first, and the keys are unique so `req` itself is never compared.
     """
-    heapq.heappush(heap, (-req.urgency, req.id, req))
+    heapq.heappush(heap, (urgency_key(req), req))
 
 
 def pop_heap(heap: list) -> Optional[FundingRequest]:
     """Pop the highest-priority (highest urgency) request from the heap.
 
-    Returns the `FundingRequest` or `None` if the heap is empty.
+    Entries are deleted lazily: a request that is no longer "submitted"
+    (decided elsewhere) is discarded until a live entry is found. Returns the
+    `FundingRequest` or `None` if the heap has no live entries.
     """
-    if not heap:
-        return None
-    _, _, req = heapq.heappop(heap)
-    return req
+    while heap:
+        req = heapq.heappop(heap)[-1]
+        if req.status == "submitted":
+            return req
+    return None
+
+
+def heap_top(heap: list) -> Optional[FundingRequest]:
+    """Return the highest-priority live request without removing it.
+
+    Dead entries sitting at the root are popped first (see `pop_heap`), so
+    the result is always a request that is still awaiting review.
+    """
+    while heap:
+        req = heap[0][-1]
+        if req.status == "submitted":
+            return req
+        heapq.heappop(heap)
+    return None
+
+
+def compact_heap(heap: list):
+    """Rebuild the heap from its live ("submitted") entries only.
+
+    Dead entries are otherwise only dropped when they reach the root; callers
+    run this once they outnumber the live ones, so they never dominate the
+    heap's memory or pop cost.
+    """
+    heap[:] = [t for t in heap if t[-1].status == "submitted"]
+    heapq.heapify(heap)
 
 
 # Approved requests queue
+#
+# The queue holds request *ids* rather than request objects. Removing an
+# arbitrary request (e.g. when it gets funded) only records the id in a
+# `deleted` set of tombstones; iteration skips tombstoned ids.
+# Once tombstones outnumber half the queue it is compacted in one pass.
 def make_queue():
     """Create a new queue (deque) for approved requests waiting to be funded."""
     return deque()
 
 
 def enqueue(q: deque, req: FundingRequest):
-    """Add a request to the end of the approved queue."""
-    q.append(req)
+    """Add a request id to the end of the approved queue."""
+    q.append(req.id)
 
 
-def dequeue(q: deque) -> Optional[FundingRequest]:
-    """Remove and return the request at the front of the queue, or None if empty."""
-    if not q:
-        return None
-    return q.popleft()
+def remove_from_queue(q: deque, deleted: set, rid: str):
+    """Mark `rid` as removed from the queue in O(1) (amortized).
+
+    The id is added to `deleted`; the queue itself is only rebuilt when
+    tombstones exceed half of its length.
+    """
+    deleted.add(rid)
+    if len(deleted) > len(q) // 2:
+        live = [i for i in q if i not in deleted]
+        q.clear()
+        q.extend(live)
+        deleted.clear()
+
+
+def iter_queue(q: deque, deleted: set, requests_map: dict) -> Iterator[FundingRequest]:
+    """Yield queued requests in FIFO order, skipping removed ids."""
+    for rid in q:
+        if rid not in deleted:
+            yield requests_map[rid]
@@ -0,0 +1,178 @@
+import json
+import os
+import stat
+import threading
+
+import pytest
+
+import storage
+from models import ROLE_ADMIN, ROLE_DONOR, ROLE_STUDENT, FundingRequest, User, parse_role
+from storage import append_event, load_state, save_state
+
+
+@pytest.fixture
+def paths(tmp_path, monkeypatch):
+    # log positions are tracked module-wide; start each test from a fresh log
+    monkeypatch.setattr(storage, "_log_base", 0)
+    return str(tmp_path / "data.json"), str(tmp_path / "data.log")
+
+
+def add_user(users, uid, log):
+    u = User(id=uid, name=uid.upper(), role=ROLE_STUDENT)
+    users[uid] = u
+    append_event("user_add", u, path=log)
+    return u
+
+
+def test_replay_applies_log_over_snapshot(paths):
+    data, log = paths
+    users, reqs = {}, {}
+    add_user(users, "u1", log)
+    save_state(users, reqs, data, log)
+    add_user(users, "u2", log)
+    r = FundingRequest(id="R1", student_id="u2", amount=10.0, urgency=3)
+    reqs[r.id] = r
+    append_event("req_add", r, path=log)
+    r.status = "approved"
+    append_event("req_update", r, path=log)
+
+    loaded_users, loaded_reqs = load_state(data, log)
+    assert loaded_users == users
+    assert loaded_reqs == reqs
+
+
+def test_replay_ignores_torn_final_line(paths):
+    data, log = paths
+    users = {}
+    add_user(users, "u1", log)
+    add_user(users, "u2", log)
+    with open(log, "ab") as f:
+        f.write(b'{"id":"u3","name":"U3","ro')
+
+    loaded_users, _ = load_state(data, log)
+    assert loaded_users == users
+
+    # a record appended after restarting must not be glued onto the torn one
+    add_user(users, "u3", log)
+    loaded_users, _ = load_state(data, log)
+    assert loaded_users == users
+    assert set(loaded_users) == {"u1", "u2", "u3"}
+
+
+def test_snapshot_keeps_records_appended_after_its_copy(paths):
+    data, log = paths
+    users = {}
+    add_user(users, "u1", log)
+    # the copy a queued snapshot would hold (see `mark_dirty`)
+    item = (dict(users), {}, data, log, storage._log_position(log))
+    add_user(users, "u2", log)
+
+    save_state(*item)
+    loaded_users, _ = load_state(data, log)
+    assert set(loaded_users) == {"u1", "u2"}
+
+
+def test_older_snapshot_is_skipped(paths):
+    data, log = paths
+    users = {}
+    add_user(users, "u1", log)
+    old = (dict(users), {}, data, log, storage._log_position(log))
+    add_user(users, "u2", log)
+    new = (dict(users), {}, data, log, storage._log_position(log))
+
+    save_state(*new)
+    save_state(*old)
+    loaded_users, _ = load_state(data, log)
+    assert set(loaded_users) == {"u1", "u2"}
+
+
+def test_no_records_lost_when_appends_race_snapshot_cuts(paths):
+    data, log = paths
+    users = {}
+    done = threading.Event()
+
+    def appender(k):
+        for i in range(200):
+            add_user(users, f"u{k}_{i}", log)
+
+    def snapshotter():
+        while not done.is_set():
+            with storage._lock:
+                item = (dict(users), {}, data, log, storage._log_position(log))
+            save_state(*item)
+
+    writer = threading.Thread(target=snapshotter)
+    writer.start()
+    appenders = [threading.Thread(target=appender, args=(k,)) for k in range(4)]
+    for t in appenders:
+        t.start()
+    for t in appenders:
+        t.join()
+    done.set()
+    writer.join()
+
+    loaded_users, _ = load_state(data, log)
+    assert set(loaded_users) == set(users)
+
+
+def test_load_baseline_snapshot_with_infinity(paths):
+    # the original storage wrote the snapshot with json.dump, which emits
+    # Infinity/NaN for non-finite amounts
+    data, log = paths
+    with open(data, "w") as f:
+        json.dump({
+            "users": [{"id": "u1", "name": "Ann", "role": "student"}],
+            "requests": [
+                {"id": "R1", "student_id": "u1", "amount": 50.0,
+                 "urgency": 2, "status": "submitted"},
+                {"id": "R2", "student_id": "u1", "amount": float("inf"),
+                 "urgency": 1, "status": "submitted"},
+            ],
+        }, f, indent=2)
+    users, reqs = load_state(data, log)
+    assert list(users) == ["u1"]
+    assert reqs["R1"].amount == 50.0
+    assert reqs["R2"].amount == 0.0
+    # the cleaned records can be written back
+    save_state(users, reqs, data, log)
+    assert load_state(data, log)[1]["R2"].amount == 0.0
+
+
+def test_unparseable_snapshot_fails_loudly(paths):
+    data, log = paths
+    with open(data, "wb") as f:
+        f.write(b'{"users": [')
+    with pytest.raises(ValueError):
+        load_state(data, log)
+    with open(data, "rb") as f:
+        assert f.read() == b'{"users": ['
+
+
+def test_unknown_stored_role_is_kept(paths):
+    data, log = paths
+    with open(data, "w") as f:
+        json.dump({"users": [{"id": "u9", "name": "Old", "role": "Admin"}],
+                   "requests": []}, f)
+    users, reqs = load_state(data, log)
+    u = users["u9"]
+    assert u.role not in (ROLE_STUDENT, ROLE_ADMIN, ROLE_DONOR)
+    assert parse_role("Admin") is None
+    save_state(users, reqs, data, log)
+    with open(data) as f:
+        assert json.load(f)["users"] == [{"id": "u9", "name": "Old", "role": "Admin"}]
+
+
+@pytest.mark.skipif(os.name != "posix", reason="POSIX file modes")
+def test_snapshot_file_mode(paths, tmp_path):
+    data, log = paths
+    # a new snapshot gets the mode a plain open() would give it
+    probe = tmp_path / "probe"
+    os.close(os.open(probe, os.O_WRONLY | os.O_CREAT, 0o666))
+    save_state({}, {}, data, log)
+    assert stat.S_IMODE(os.stat(data).st_mode) == stat.S_IMODE(os.stat(probe).st_mode)
+
+    # an existing snapshot keeps its mode across rewrites
+    os.chmod(data, 0o640)
+    save_state({}, {}, data, log)
+    assert stat.S_IMODE(os.stat(data).st_mode) == 0o640
+    assert not [n for n in os.listdir(tmp_path) if n.endswith(".tmp")]
@@ -0,0 +1,142 @@
+import math
+
+from models import FundingRequest
+from structures import (
+    RequestBST, compact_heap, enqueue, heap_top, iter_queue, make_queue, pop_heap,
+    push_heap, remove_from_queue,
+)
+
+
+def make_requests(amounts):
+    return [FundingRequest(id=f"R{i}", student_id="s", amount=a, urgency=1) for i, a in enumerate(amounts, 1)]
+
+
+def depth(node):
+    # iterative so a degenerate tree cannot hit the recursion limit in the test itself
+    best, stack = 0, [(node, 1)] if node else []
+    while stack:
+        n, d = stack.pop()
+        best = max(best, d)
+        stack.extend((c, d + 1) for c in (n.left, n.right) if c)
+    return best
+
+
+def subtree_size(node):
+    if node is None:
+        return 0
+    size = 1 + subtree_size(node.left) + subtree_size(node.right)
+    assert node.size == size
+    return size
+
+
+def max_depth(n):
+    return math.log(n, 1 / RequestBST.ALPHA) + 2
+
+
+def test_inorder_sorted_after_sorted_inserts_stays_shallow():
+    reqs = make_requests(range(2000))
+    bst = RequestBST()
+    for r in reqs:
+        bst.insert(r)
+    assert bst.inorder() == reqs
+    assert depth(bst.root) <= max_depth(len(reqs))
+    assert subtree_size(bst.root) == len(reqs)
+
+
+def test_inorder_after_descending_inserts():
+    reqs = make_requests(range(2000, 0, -1))
+    bst = RequestBST()
+    for r in reqs:
+        bst.insert(r)
+    assert bst.inorder() == list(reversed(reqs))
+    assert depth(bst.root) <= max_depth(len(reqs))
+
+
+def test_duplicates_keep_insertion_order():
+    reqs = make_requests([5, 3, 5, 5, 1, 3, 5] * 200)
+    bst = RequestBST()
+    for r in reqs:
+        bst.insert(r)
+    # sorted() is stable, so equal amounts must stay in insertion order
+    assert bst.inorder() == sorted(reqs, key=lambda r: r.amount)
+    assert depth(bst.root) <= max_depth(len(reqs))
+    assert subtree_size(bst.root) == len(reqs)
+
+
+def test_inorder_cache_is_refreshed_by_insert_and_returns_copies():
+    a, b = make_requests([2, 1])
+    bst = RequestBST()
+    bst.insert(a)
+    first = bst.inorder()
+    first.clear()
+    assert bst.inorder() == [a]
+    bst.insert(b)
+    assert bst.inorder() == [b, a]
+
+
+def make_heap(urgencies):
+    reqs = [FundingRequest(id=f"R{i}", student_id="s", amount=1.0, urgency=u) for i, u in enumerate(urgencies, 1)]
+    heap = []
+    for r in reqs:
+        push_heap(heap, r)
+    return heap, reqs
+
+
+def test_pop_heap_skips_decided_entries():
+    heap, reqs = make_heap([9, 8, 7, 6, 5, 4, 3, 2, 1, 0])
+    reqs[0].status = "rejected"
+    reqs[1].status = "approved"
+    assert pop_heap(heap) is reqs[2]
+
+
+def test_heap_top_skips_dead_root_entries():
+    heap, reqs = make_heap([9, 8, 7])
+    reqs[0].status = "approved"
+    reqs[1].status = "rejected"
+    assert heap_top(heap) is reqs[2]
+    # heap_top does not consume the live entry
+    assert pop_heap(heap) is reqs[2]
+    assert pop_heap(heap) is None
+    assert heap_top(heap) is None
+
+
+def test_compact_heap_keeps_only_live_entries():
+    heap, reqs = make_heap(range(10))
+    for r in reqs[:6]:
+        r.status = "approved"
+    compact_heap(heap)
+    assert len(heap) == 4
+    assert [pop_heap(heap).id for _ in range(4)] == ["R10", "R9", "R8", "R7"]
+
+
+def test_heap_ties_follow_numeric_submission_order():
+    heap, reqs = make_heap([5] * 11)
+    assert [pop_heap(heap).id for _ in range(11)] == [f"R{i}" for i in range(1, 12)]
+
+
+def make_queue_of(n):
+    reqs = {f"R{i}": FundingRequest(id=f"R{i}", student_id="s", amount=1.0, urgency=1) for i in range(1, n + 1)}
+    q = make_queue()
+    for r in reqs.values():
+        enqueue(q, r)
+    return q, reqs
+
+
+def test_iter_queue_keeps_fifo_order_around_tombstones():
+    q, reqs = make_queue_of(6)
+    deleted = set()
+    remove_from_queue(q, deleted, "R2")
+    remove_from_queue(q, deleted, "R5")
+    assert len(q) == 6  # tombstoned, not yet compacted
+    assert [r.id for r in iter_queue(q, deleted, reqs)] == ["R1", "R3", "R4", "R6"]
+
+
+def test_remove_from_queue_compacts_when_tombstones_dominate():
+    q, reqs = make_queue_of(6)
+    deleted = set()
+    for rid in ("R1", "R3", "R4"):
+        remove_from_queue(q, deleted, rid)
+    assert len(q) == 6 and deleted == {"R1", "R3", "R4"}
+    remove_from_queue(q, deleted, "R6")
+    assert list(q) == ["R2", "R5"] and not deleted
+    assert [r.id for r in iter_queue(q, deleted, reqs)] == ["R2", "R5"]
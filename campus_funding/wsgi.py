@@ -0,0 +1,14 @@
+"""WSGI entrypoint for serving the web UI with gunicorn + gevent.
+
+Run from this folder: gunicorn -c gunicorn_conf.py wsgi:app
+
+gevent's monkey patching must happen before anything else imports the
+stdlib modules it replaces (socket, threading, ...), so it comes first.
+Note that this also turns the storage writer thread into a greenlet, so
+snapshot writes briefly block the event loop (see `storage.py`).
+"""
+from gevent import monkey
+
+monkey.patch_all()
+
+from app import app  # noqa: E402